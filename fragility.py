@@ -1,125 +1,457 @@
 import chess
-import chess.pgn
+import chess.polyglot
+import functools
 import networkx as nx
+import io
 import re
+import mmap
+import random
+import sys
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
-parser = argparse.ArgumentParser(description='Calculate fragility and evaluation scores from a PGN file.')
-parser.add_argument('filepath', type=str, help='Path to the PGN file')
-args = parser.parse_args()
-file_path = args.filepath
+try:
+    import igraph as ig
+    nk = None
+except ImportError:  # try NetworKit, then numba or the pure-Python Brandes below
+    ig = None
+    try:
+        import networkit as nk
+    except ImportError:
+        nk = None
 
-def compute_interactions_for_color(board, color_turn):
+# Fragility results already computed, keyed by the Zobrist hash of the
+# position and the number of sampled sources (None for the exact BC)
+_fragility_cache = {}
+
+# Seed of the source sampling, so that approximate scores are reproducible
+SAMPLING_SEED = 42
+
+
+def build_interaction_graph(board):
     """
-    Builds a subgraph of interactions (attack/defense) **only** for the color 'color_turn'.
-    Returns a networkx DiGraph with colored edges:
-      - 'red' for attack,
-      - 'blue' (if color_turn is WHITE) or 'green' (if color_turn is BLACK) for defense.
-    The nodes are (square, piece).
+    Builds the interaction graph (attack/defense) of all pieces on the board.
+    Returns (G, attacked) where:
+      - G is a networkx DiGraph whose nodes are the squares (0-63) of the
+        pieces, with an edge from each piece to every piece it attacks
+        (opposite color) or defends (same color),
+      - attacked is the set of squares of the pieces under attack.
     """
     G = nx.DiGraph()
+    attacked = set()
     
-    # List of all pieces on the board
-    piece_positions = {sq: board.piece_at(sq) for sq in chess.SQUARES if board.piece_at(sq)}
+    # Occupied squares, read straight from the bitboards
+    occupied = board.occupied
+    white, black = board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK]
     
-    # To ensure the current turn is 'color_turn'
-    board_copy = board.copy()
-    board_copy.turn = color_turn
-
     # Add all nodes (regardless of color) so they can appear as edge targets
-    for sq, pc in piece_positions.items():
-        G.add_node((sq, pc))
-    
-    # For each piece of the color 'color_turn', check possible attacks/defenses
-    for square_a, piece_a in piece_positions.items():
-        if piece_a.color == color_turn:
-            # Iterate over all other squares
-            for square_b, piece_b in piece_positions.items():
-                if square_b == square_a:
-                    continue
-
-                # Define nodes as (sq, piece)
-                node_a = (square_a, piece_a)
-                node_b = (square_b, piece_b)
-
-                # Defense (same color)
-                if piece_b.color == piece_a.color:
-                    # To check if it is really possible to "defend" that piece
-                    # (i.e., if it would move to that square in a legal move)
-                    backup_piece = board_copy.remove_piece_at(square_b)
-                    move = chess.Move(from_square=square_a, to_square=square_b)
-                    if move in board_copy.legal_moves:
-                        # The edge color follows the convention of code 1:
-                        # - 'blue' if it is White,
-                        # - 'green' if it is Black.
-                        edge_color = 'blue' if color_turn == chess.WHITE else 'green'
-                        G.add_edge(node_a, node_b, color=edge_color, interaction='defense')
-                    # Put the piece back on square_b
-                    if backup_piece is not None:
-                        board_copy.set_piece_at(square_b, backup_piece)
-
-                # Attack (different colors)
-                else:
-                    # Special treatment for pawns: they only capture diagonally if there is an enemy piece on that diagonal
-                    if piece_a.piece_type == chess.PAWN:
-                        if piece_b is not None:  # there is an opposite color piece
-                            move = chess.Move(from_square=square_a, to_square=square_b)
-                            if move in board_copy.legal_moves:
-                                G.add_edge(node_a, node_b, color='red', interaction='attack')
-                    else:
-                        # For non-pawn pieces, we directly check if the move is legal
-                        move = chess.Move(from_square=square_a, to_square=square_b)
-                        if move in board_copy.legal_moves:
-                            G.add_edge(node_a, node_b, color='red', interaction='attack')
-    
-    return G
+    G.add_nodes_from(chess.scan_reversed(occupied))
+    
+    # Each piece interacts with the occupied squares it attacks
+    # (attacks_mask returns the raw bitboard, without a SquareSet wrapper)
+    for sq_i in chess.scan_reversed(occupied):
+        opponents = black if white & chess.BB_SQUARES[sq_i] else white
+        targets = board.attacks_mask(sq_i) & occupied
+        for sq_j in chess.scan_reversed(targets):
+            G.add_edge(sq_i, sq_j)
+        attacked.update(chess.scan_reversed(targets & opponents))
+    
+    return G, attacked
 
 
-def build_interaction_graph(board):
+def _piece_bitboards(board):
+    """
+    Bitboards that together describe the piece placement of the board.
+    """
+    return (board.pawns, board.knights, board.bishops, board.rooks,
+            board.queens, board.kings, board.occupied_co[chess.WHITE])
+
+
+def _attackers_of(board, squares):
+    """
+    Squares of the pieces (of both colors) attacking any of the given squares.
+    """
+    attackers = 0
+    for sq in squares:
+        attackers |= board.attackers_mask(chess.WHITE, sq) | board.attackers_mask(chess.BLACK, sq)
+    return chess.SquareSet(attackers)
+
+
+def _add_interactions(G, board, sq_i):
+    """
+    (Re)builds the outgoing edges of the piece on sq_i.
+    Returns the squares whose incoming edges may have changed.
+    """
+    targets = set(G.successors(sq_i))
+    G.remove_edges_from([(sq_i, sq_j) for sq_j in targets])
+    for sq_j in chess.scan_reversed(board.attacks_mask(sq_i) & board.occupied):
+        G.add_edge(sq_i, sq_j)
+        targets.add(sq_j)
+    return targets
+
+
+def update_interaction_graph(graph, board, move):
+    """
+    Plays the move on the board and updates in place the interaction graph
+    (G, attacked) built by build_interaction_graph for the position before
+    the move. Only the pieces whose interactions can change are revisited:
+      - the pieces on the squares changed by the move (the moving piece, the
+        captured piece, the rook when castling),
+      - the pieces attacking those squares before or after the move, whose
+        rays may be blocked or unblocked, or whose target changed.
+    """
+    G, attacked = graph
+    before = _piece_bitboards(board)
+    occupied_before = board.occupied
+    
+    # Squares whose content changes, found by comparing the piece placement
+    board.push(move)
+    changed_bb = 0
+    for bb_before, bb_after in zip(before, _piece_bitboards(board)):
+        changed_bb |= bb_before ^ bb_after
+    changed = chess.SquareSet(changed_bb)
+    
+    # Pieces attacking the changed squares after the move, and those that
+    # attacked the old pieces of these squares (their predecessors in G).
+    # A piece attacking a changed square that was empty still attacks it
+    # after the move, so the board never needs to be taken back
+    affected = _attackers_of(board, changed)
+    touched = set(changed & board.occupied)
+    for sq in changed & occupied_before:
+        affected |= G.predecessors(sq)
+        touched.update(G.successors(sq))
+    
+    # Remove the old pieces of the changed squares (with all their edges)
+    G.remove_nodes_from(changed & occupied_before)
+    attacked.difference_update(changed)
+    
+    # Add the new pieces and rebuild the edges of every affected piece
+    G.add_nodes_from(changed & board.occupied)
+    for sq in (affected - changed) | (changed & board.occupied):
+        touched |= _add_interactions(G, board, sq)
+    
+    # Refresh the attacked status of the pieces whose attackers may have changed
+    white = board.occupied_co[chess.WHITE]
+    for sq_j in touched:
+        if sq_j not in G:
+            continue
+        color_j = bool(white & chess.BB_SQUARES[sq_j])
+        if any(bool(white & chess.BB_SQUARES[sq_i]) != color_j for sq_i in G.predecessors(sq_j)):
+            attacked.add(sq_j)
+        else:
+            attacked.discard(sq_j)
+
+
+def csr_adjacency(n, edges):
+    """
+    Converts a list of directed edges (u, v) between vertices 0..n-1 into a
+    CSR adjacency (indptr, indices): the successors of u are
+    indices[indptr[u]:indptr[u + 1]].
+    """
+    indptr = [0] * (n + 1)
+    for u, _ in edges:
+        indptr[u + 1] += 1
+    for i in range(n):
+        indptr[i + 1] += indptr[i]
+    
+    indices = [0] * len(edges)
+    fill = indptr[:-1]
+    for u, v in edges:
+        indices[fill[u]] = v
+        fill[u] += 1
+    
+    return indptr, indices
+
+
+# Work arrays of brandes_betweenness, allocated once and reused by every BFS
+# (sized for the 32 pieces of a chess position, grown for larger graphs)
+_bfs_preds = [[] for _ in range(32)]
+_bfs_sigma = [0] * 32
+_bfs_dist = [-1] * 32
+_bfs_delta = [0.0] * 32
+
+
+def brandes_betweenness(n, indptr, indices, sources=None):
+    """
+    Unnormalized betweenness centrality of a directed, unweighted graph given
+    as a CSR adjacency (Brandes' algorithm: one BFS per source, followed by
+    the accumulation of dependencies in reverse BFS order).
+    If sources is given, only the BFS from these vertices are run.
+    """
+    if n > len(_bfs_sigma):
+        extra = n - len(_bfs_sigma)
+        _bfs_preds.extend([] for _ in range(extra))
+        _bfs_sigma.extend([0] * extra)
+        _bfs_dist.extend([-1] * extra)
+        _bfs_delta.extend([0.0] * extra)
+    preds, sigma, dist, delta = _bfs_preds, _bfs_sigma, _bfs_dist, _bfs_delta
+    
+    bc = [0.0] * n
+    for s in (range(n) if sources is None else sources):
+        # A source without successors reaches no other vertex
+        if indptr[s] == indptr[s + 1]:
+            continue
+        
+        # BFS from s, counting shortest paths (sigma) and their predecessors
+        sigma[s] = 1
+        dist[s] = 0
+        queue = [s]
+        head = 0
+        while head < len(queue):
+            v = queue[head]
+            head += 1
+            dist_w = dist[v] + 1
+            for k in range(indptr[v], indptr[v + 1]):
+                w = indices[k]
+                if dist[w] < 0:
+                    dist[w] = dist_w
+                    queue.append(w)
+                if dist[w] == dist_w:
+                    sigma[w] += sigma[v]
+                    preds[w].append(v)
+        
+        # Accumulate the dependencies of s on every other vertex, in reverse
+        # BFS order; each vertex is done once processed, so its work entries
+        # are reset right away for the next BFS (only visited ones are dirty)
+        for w in reversed(queue):
+            coeff = (1.0 + delta[w]) / sigma[w]
+            for v in preds[w]:
+                delta[v] += sigma[v] * coeff
+            if w != s:
+                bc[w] += delta[w]
+            preds[w].clear()
+            sigma[w] = 0
+            dist[w] = -1
+            delta[w] = 0.0
+    
+    return bc
+
+
+@functools.lru_cache(maxsize=None)
+def sample_sources(n, samples):
+    """
+    Sources of the Brandes BFS runs among n vertices: all of them, or
+    'samples' of them drawn at random (Brandes-Pich approximation).
+    Returns None when all vertices are used. The draw only depends on n and
+    samples (the seed is fixed), so it is cached.
+    """
+    if samples is not None and samples < 1:
+        raise ValueError(f"The number of sampled sources must be at least 1, got {samples}.")
+    if samples is None or samples >= n:
+        return None
+    return tuple(random.Random(SAMPLING_SEED).sample(range(n), samples))
+
+
+def _bc_scale(n, n_total, sources):
+    """
+    Factor applied to the raw BC: the networkx normalization
+    1 / ((n_total - 1) * (n_total - 2)), times n / k when only k sampled
+    sources were used.
+    """
+    scale = 1.0 if sources is None else n / len(sources)
+    if n_total > 2:
+        scale /= (n_total - 1) * (n_total - 2)
+    return scale
+
+
+def betweenness_centrality(n, edges, n_total=None, samples=None):
+    """
+    Betweenness centrality of the directed graph with vertices 0..n-1 and the
+    given edges, normalized as in networkx by 1 / ((N - 1) * (N - 2)), where
+    N is n_total (the node count of the full graph when isolated nodes were
+    left out of the vertex set) or n if not given.
+    Uses igraph's C implementation or NetworKit's C++ one when available,
+    and the pure-Python Brandes algorithm otherwise.
+    If samples is given, the BC is estimated from that many random sources
+    and scaled by n / samples. igraph runs the BFS from these sources only;
+    NetworKit cannot be given the sources (its estimators draw their own),
+    so sampling falls back to the pure-Python Brandes algorithm there.
+    """
+    sources = sample_sources(n, samples)
+    if ig is not None:
+        bc = ig.Graph(n=n, edges=edges, directed=True).betweenness(directed=True, sources=sources)
+    elif nk is not None and sources is None:
+        g = nk.Graph(n, directed=True)
+        for u, v in edges:
+            g.addEdge(u, v)
+        bc = nk.centrality.Betweenness(g, normalized=False).run().scores()
+    else:
+        bc = brandes_betweenness(n, *csr_adjacency(n, edges), sources=sources)
+    
+    if n_total is None:
+        n_total = n
+    scale = _bc_scale(n, n_total, sources)
+    return [b * scale for b in bc]
+
+
+def _make_fragility_csr(np):
+    """
+    Builds the fused fragility computation on a CSR adjacency, on top of the
+    numpy module np (imported by _numba_kernel, which compiles it with numba):
+    the returned function runs Brandes' algorithm from the given sources
+    (dependencies are accumulated from the successors of each vertex, so no
+    predecessor lists are needed), scales the BC by 'scale' (see _bc_scale)
+    and reduces it over the attacked vertices, returning (fragility, top
+    attacked vertex id).
+    """
+    def fragility_csr(indptr, indices, sources, attacked, scale):
+        n = indptr.shape[0] - 1
+        bc = np.zeros(n)
+        order = np.empty(n, np.int64)
+        dist = np.empty(n, np.int64)
+        sigma = np.empty(n)
+        delta = np.empty(n)
+        for s in sources:
+            if indptr[s] == indptr[s + 1]:
+                continue
+            
+            dist[:] = -1
+            sigma[:] = 0.0
+            dist[s] = 0
+            sigma[s] = 1.0
+            order[0] = s
+            head = 0
+            tail = 1
+            while head < tail:
+                v = order[head]
+                head += 1
+                for k in range(indptr[v], indptr[v + 1]):
+                    w = indices[k]
+                    if dist[w] < 0:
+                        dist[w] = dist[v] + 1
+                        order[tail] = w
+                        tail += 1
+                    if dist[w] == dist[v] + 1:
+                        sigma[w] += sigma[v]
+            
+            # Reverse BFS order, skipping the source itself (order[0])
+            for i in range(tail - 1, 0, -1):
+                v = order[i]
+                delta[v] = 0.0
+                for k in range(indptr[v], indptr[v + 1]):
+                    w = indices[k]
+                    if dist[w] == dist[v] + 1:
+                        delta[v] += sigma[v] / sigma[w] * (1.0 + delta[w])
+                bc[v] += delta[v]
+        
+        fragility = 0.0
+        top = -1
+        best = -1.0
+        for v in attacked:
+            b = bc[v] * scale
+            fragility += b
+            if b > best:
+                best = b
+                top = v
+        return fragility, top
+    
+    return fragility_csr
+
+
+@functools.lru_cache(maxsize=None)
+def _numba_kernel():
     """
-    Builds the complete interaction graph by combining (via nx.compose) the graph of
-    white pieces and the graph of black pieces, following the logic of the first code.
+    The computation of _make_fragility_csr compiled with numba, taking the
+    CSR adjacency, sources and attacked vertices as sequences, or None if
+    numba is not installed. numba (and numpy) are only imported on first
+    use, since it is only the backend when neither igraph nor NetworKit is
+    available.
     """
-    G_white = compute_interactions_for_color(board, chess.WHITE)
-    G_black = compute_interactions_for_color(board, chess.BLACK)
-    G_full = nx.compose(G_white, G_black)
-    return G_full
+    try:
+        import numba
+        import numpy
+    except ImportError:
+        return None
+    fragility_csr = numba.njit(cache=True)(_make_fragility_csr(numpy))
+    
+    def kernel(indptr, indices, sources, attacked, scale):
+        return fragility_csr(numpy.array(indptr), numpy.array(indices),
+                             numpy.array(sources), numpy.array(attacked), scale)
+    return kernel
 
 
-def compute_fragility_score(board):
+def compute_fragility_score(board, graph=None, samples=None):
     """
     Calculates the fragility score using the same logic as the first code:
-      - Builds the interaction graph (attack/defense);
-      - Calculates Betweenness Centrality (normalized);
-      - Identifies nodes that are under attack (receive 'red' edge);
+      - Builds the interaction graph (attack/defense), unless graph is given
+        (e.g. kept up to date with update_interaction_graph);
+      - Calculates Betweenness Centrality (normalized), estimated from
+        'samples' random sources if given;
+      - Identifies nodes that are under attack;
       - Sum of the BCs of these nodes => fragility score;
       - top_piece => node (square, piece) with the highest BC among those attacked.
+    Results are cached by the Zobrist hash of the position, so repeated
+    positions are only computed once.
     """
-    G = build_interaction_graph(board)
+    key = (chess.polyglot.zobrist_hash(board), samples)
+    result = _fragility_cache.get(key)
+    if result is None:
+        if graph is None:
+            graph = build_interaction_graph(board)
+        fragility, top_sq = fragility_from_graph(*graph, samples=samples)
+        top_node = (top_sq, board.piece_at(top_sq)) if top_sq is not None else None
+        result = _fragility_cache[key] = (fragility, top_node)
+    return result
 
-    # If there are no nodes in the graph, fragility is 0
-    if len(G) == 0:
+
+def fragility_from_graph(G, attacked, samples=None):
+    """
+    Uncached computation behind compute_fragility_score, from the
+    interaction graph G of the position and the squares of the pieces under
+    attack. Returns the fragility score and the square of the top attacked
+    piece (None if no piece is attacked).
+    """
+    # If no piece is under attack, fragility is 0
+    if not attacked:
         return 0.0, None
     
-    # Normalized betweenness centrality
-    bc = nx.betweenness_centrality(G, normalized=True)
+    # Map the squares to consecutive vertex ids (in square order, so that the
+    # sampled sources do not depend on how G was built). Pieces without any
+    # interaction lie on no path and have BC 0, so they are left out of the
+    # vertex set (they still count for the normalization)
+    nodes = sorted(sq for sq, degree in G.degree() if degree)
+    index = {sq: i for i, sq in enumerate(nodes)}
+    n = len(nodes)
     
-    # Identify pieces under attack (nodes that receive 'red' edge)
-    attacked_nodes = set()
-    for u, v, data in G.edges(data=True):
-        if data.get("color") == "red":
-            attacked_nodes.add(v)
+    edges = [(index[u], index[v]) for u, v in G.edges()]
+    attacked_idx = [index[sq] for sq in sorted(attacked)]
     
-    if not attacked_nodes:
-        return 0.0, None
+    # Without igraph or NetworKit (or with NetworKit only, when sampling,
+    # which it cannot do from given sources), numba (if installed) runs the
+    # whole BC + reduction as native code
+    use_kernel = ig is None and (nk is None or samples is not None)
+    kernel = _numba_kernel() if use_kernel else None
+    if kernel is not None:
+        indptr, indices = csr_adjacency(n, edges)
+        sources = sample_sources(n, samples)
+        scale = _bc_scale(n, len(G), sources)
+        fragility, top = kernel(indptr, indices,
+                                range(n) if sources is None else sources,
+                                attacked_idx, scale)
+        return fragility, nodes[top]
     
-    # Fragility score: sum of the BC of the attacked pieces
-    fragility = sum(bc[node] for node in attacked_nodes)
+    # Normalized betweenness centrality, indexed by vertex id
+    bc = betweenness_centrality(n, edges, n_total=len(G), samples=samples)
     
-    # top_piece: the attacked piece with the highest BC
-    top_node = max(attacked_nodes, key=lambda node: bc[node])
+    # In one pass over the attacked pieces:
+    # - fragility score: sum of their BC
+    # - top_piece: the attacked piece with the highest BC
+    fragility = 0.0
+    top_idx = None
+    top_bc = -1.0
+    for i in attacked_idx:
+        b = bc[i]
+        fragility += b
+        if b > top_bc:
+            top_bc = b
+            top_idx = i
     
-    return fragility, top_node
+    return fragility, nodes[top_idx]
+
+
+# Engine evaluation embedded in a PGN comment
+_EVAL_RE = re.compile(r"\[%eval ([+-]?[0-9.]+|#-?\d+)\]")
 
 
 def extract_eval(comment):
@@ -129,7 +461,10 @@ def extract_eval(comment):
     Possible matches examples: 
       0.56, -1.20, #3 (mate in 3), #-4 (mate for the opposite side) etc.
     """
-    match = re.search(r"\[%eval ([+-]?[0-9.]+|#-?\d+)\]", comment)
+    # Most comments carry no evaluation; a substring test is cheaper than the regex
+    if "[%eval" not in comment:
+        return None
+    match = _EVAL_RE.search(comment)
     if match:
         eval_str = match.group(1)
         if "#" in eval_str:
@@ -138,7 +473,167 @@ def extract_eval(comment):
     return None
 
 
-def fragility_and_eval_by_ply(pgn_file):
+# PGN tag pair, e.g. [Event "Rated rapid game"]
+_PGN_TAG_RE = re.compile(r'\s*\[\s*(\w+)\s*"((?:[^"\\]|\\.)*)"\s*\]')
+
+# Movetext tokens; anything else (whitespace, annotation glyphs) is skipped
+_PGN_TOKEN_RE = re.compile(r"""
+    \{(?P<comment>[^}]*)\}                       # { comment }
+  | ;[^\n]*                                      # rest-of-line comment
+  | ^%[^\n]*                                     # escaped line
+  | (?P<open>\() | (?P<close>\))                  # variation
+  | (?P<tag>\[)                                  # tag pair of the next game
+  | \$\d+                                        # NAG
+  | (?P<result>1-0|0-1|1/2-1/2|\*)                # game termination
+  | \d+\.+                                       # move number
+  | (?P<san>[A-Za-z][A-Za-z0-9=+\#-]*|0-0(?:-0)?|--) # move in SAN (or null move)
+""", re.VERBOSE | re.MULTILINE)
+
+# Same patterns, to scan the raw bytes of a (memory-mapped) PGN file
+_PGN_TAG_RE_BYTES = re.compile(_PGN_TAG_RE.pattern.encode())
+_PGN_TOKEN_RE_BYTES = re.compile(_PGN_TOKEN_RE.pattern.encode(), re.VERBOSE | re.MULTILINE)
+
+
+def _decode(token):
+    """
+    Text of a token scanned from the raw bytes of a PGN file.
+    """
+    return token.decode("utf-8", errors="replace")
+
+
+def read_first_game(pgn_text, pos=0):
+    """
+    Tokenizes the first game of a PGN text, without building a game tree.
+    pgn_text can be a str or a bytes-like object (e.g. a memory map of the
+    file); the scan starts at index pos and stops at the end of the first
+    game found there, so the rest of the text is never touched.
+    Returns (board, moves, end) where:
+      - board is the starting position (from the FEN tag, if any)
+      - moves is the list of (san, comment) pairs of the main line, where
+        comment joins all the comments that follow the move
+      - end is the index just past the game (after its result, or at the
+        tags of the next game), where the next game can be read from
+    Variations, NAGs and move numbers are skipped.
+    """
+    if isinstance(pgn_text, str):
+        tag_re, token_re, decode = _PGN_TAG_RE, _PGN_TOKEN_RE, str
+        if pgn_text.startswith("\ufeff", pos):
+            pos += 1
+    else:
+        tag_re, token_re, decode = _PGN_TAG_RE_BYTES, _PGN_TOKEN_RE_BYTES, _decode
+        if pgn_text[pos:pos + 3] == b"\xef\xbb\xbf":
+            pos += 3
+    
+    # Tag pairs
+    tags = {}
+    match = tag_re.match(pgn_text, pos)
+    while match:
+        tags[decode(match.group(1))] = decode(match.group(2))
+        pos = match.end()
+        match = tag_re.match(pgn_text, pos)
+    
+    if "FEN" in tags:
+        board = chess.Board(tags["FEN"], chess960="960" in tags.get("Variant", ""))
+    else:
+        board = chess.Board()
+    
+    # Main line of the movetext (depth 0), up to the result of the game
+    moves = []
+    comments = []
+    depth = 0
+    end = len(pgn_text)
+    for token in token_re.finditer(pgn_text, pos):
+        kind = token.lastgroup
+        if kind == "open":
+            depth += 1
+        elif kind == "close":
+            depth -= 1
+        elif depth > 0:
+            continue
+        elif kind == "san":
+            if moves:
+                moves[-1] = (moves[-1][0], " ".join(comments))
+            moves.append((decode(token.group("san")), ""))
+            comments = []
+        elif kind == "comment":
+            comments.append(decode(token.group("comment")).strip())
+        elif kind == "result":
+            end = token.end()
+            break
+        elif kind == "tag":
+            end = token.start()
+            break
+    if moves:
+        moves[-1] = (moves[-1][0], " ".join(comments))
+    elif not tags:
+        raise ValueError("No valid game was found in the PGN.")
+    
+    return board, moves, end
+
+
+def read_first_game_from_file(pgn_file):
+    """
+    read_first_game for an open PGN file, reading the first game from the
+    current position of the file and leaving the file positioned just past
+    that game, like chess.pgn.read_game. Returns (board, moves).
+    Regular files are memory-mapped, so that only the pages of that game are
+    read (and no decoded copy of the whole file is made); other files
+    (io.StringIO, pipes, ...) are read entirely, and a stream that cannot
+    seek (a pipe) is consumed to its end.
+    """
+    try:
+        fileno = pgn_file.fileno()
+        pgn_map = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    except (AttributeError, io.UnsupportedOperation, ValueError, OSError):
+        # No file descriptor, empty file, or a pipe/FIFO that cannot be mapped
+        seekable = pgn_file.seekable()
+        start = pgn_file.tell() if seekable else 0
+        board, moves, end = read_first_game(pgn_file.read())
+        if seekable:
+            pgn_file.seek(start + end)
+        return board, moves
+    with pgn_map:
+        board, moves, end = read_first_game(pgn_map, pgn_file.tell())
+    pgn_file.seek(end)
+    return board, moves
+
+
+def _fragility_from_fen(fen, samples=None):
+    """
+    Process pool worker: fragility score and top node of the position given by its FEN.
+    """
+    return compute_fragility_score(chess.Board(fen), samples=samples)
+
+
+def _fragility_and_eval_parallel(board, moves, jobs, samples=None):
+    """
+    Parallel version of the loop of fragility_and_eval_by_ply: the main line
+    is first replayed to collect the positions, whose fragility is then
+    computed by a pool of 'jobs' processes (each distinct position once).
+    """
+    # First pass: (move_uci, eval_score, position key, FEN) of every ply
+    plies = [("start-pos", None, (chess.polyglot.zobrist_hash(board), samples), board.fen())]
+    for san, comment in moves:
+        move = board.push_san(san)
+        key = (chess.polyglot.zobrist_hash(board), samples)
+        plies.append((move.uci(), extract_eval(comment), key, board.fen()))
+    
+    # Second pass: positions not computed yet, mapped through the process pool
+    pending = {key: fen for _, _, key, fen in plies if key not in _fragility_cache}
+    if pending:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            scores = executor.map(_fragility_from_fen, pending.values(), repeat(samples), chunksize=8)
+            for key, result in zip(pending, scores):
+                _fragility_cache[key] = result
+    
+    results = []
+    for ply_count, (move_uci, eval_score, key, _) in enumerate(plies):
+        current_frag, top_piece = _fragility_cache[key]
+        results.append((ply_count, move_uci, current_frag, eval_score, top_piece))
+    return results
+
+
+def fragility_and_eval_by_ply(pgn_file, jobs=1, samples=None):
     """
     Reads the first game from the PGN file and returns a list of tuples:
       (ply_number, move_uci, fragility_score, eval_score, top_node)
@@ -148,51 +643,72 @@ def fragility_and_eval_by_ply(pgn_file):
       - fragility_score is the value calculated by the sum of the BCs of the pieces under attack
       - eval_score is the evaluation value extracted from the comment (None if not found)
       - top_node is the piece (square, piece) with the highest BC among those under attack
+    With jobs > 1, the fragility scores are computed by a pool of that many processes.
+    With samples, the betweenness centrality is estimated from that many
+    random sources per position instead of computed exactly.
     """
-    game = chess.pgn.read_game(pgn_file)
-    if game is None:
-        raise ValueError("No valid game was found in the PGN.")
+    if jobs < 1:
+        raise ValueError(f"The number of processes must be at least 1, got {jobs}.")
+    
+    board, moves = read_first_game_from_file(pgn_file)
+    if jobs > 1:
+        return _fragility_and_eval_parallel(board, moves, jobs, samples)
     
-    board = game.board()
-    node = game
+    graph = build_interaction_graph(board)
 
     results = []
     ply_count = 0
     
     # Initial position (before any move)
-    current_frag, top_piece = compute_fragility_score(board)
+    current_frag, top_piece = compute_fragility_score(board, graph, samples)
     results.append((ply_count, "start-pos", current_frag, None, top_piece))
     
-    # Iterate over the main line of moves
-    while not node.is_end():
-        next_node = node.variation(0)
-        move = next_node.move
-        
-        board.push(move)
+    # Iterate over the main line of moves, updating the graph incrementally
+    for san, comment in moves:
+        move = board.parse_san(san)
+        update_interaction_graph(graph, board, move)
         ply_count += 1
         
-        current_frag, top_piece = compute_fragility_score(board)
+        current_frag, top_piece = compute_fragility_score(board, graph, samples)
         
-        comment = next_node.comment
         eval_score = extract_eval(comment)
         
         move_uci = move.uci()
         
         results.append((ply_count, move_uci, current_frag, eval_score, top_piece))
-        
-        node = next_node
     
     return results
 
 
+def positive_int(value):
+    """
+    argparse type for options that take an integer >= 1.
+    """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
 if __name__ == "__main__":    
-    with open(file_path, "r") as pgn_file:
-        scores = fragility_and_eval_by_ply(pgn_file)
+    parser = argparse.ArgumentParser(description='Calculate fragility and evaluation scores from a PGN file.')
+    parser.add_argument('filepath', type=str, help='Path to the PGN file')
+    parser.add_argument('-j', '--jobs', type=positive_int, default=1,
+                        help='Number of processes computing the fragility scores (default: 1)')
+    parser.add_argument('-k', '--samples', type=positive_int, default=None,
+                        help='Estimate the betweenness centrality from this many random sources '
+                             'per position (default: exact computation)')
+    args = parser.parse_args()
+    file_path = args.filepath
+    
+    with open(file_path, "rb") as pgn_file:
+        scores = fragility_and_eval_by_ply(pgn_file, jobs=args.jobs, samples=args.samples)
     
     cumulative_eval = 0.0
     
-    print("Ply | Move      | Fragility  | Eval   | TopAttackedPiece")
-    print("--------------------------------------------------------")
+    # Rows are collected and written at once
+    rows = ["Ply | Move      | Fragility  | Eval   | TopAttackedPiece",
+            "--------------------------------------------------------"]
     for ply_num, move_uci, frag_score, eval_score, top_node in scores:
         # Display the move
         if move_uci is None:
@@ -214,4 +730,6 @@ if __name__ == "__main__":
         
         # Note that we are printing the actual ply (ply_num),
         # but you can divide by 2 if you want the "chess move number".
-        print(f"{ply_num:3d} | {move_uci:9s} | {frag_score:10.3f} | {eval_display:6s} | {top_node_str:20s}")
+        rows.append(f"{ply_num:3d} | {move_uci:9s} | {frag_score:10.3f} | {eval_display:6s} | {top_node_str:20s}")
+    
+    sys.stdout.write("\n".join(rows) + "\n")